@@ -2,10 +2,12 @@
 Database connection and utilities for NBA data import
 """
 import os
+import uuid
 import asyncio
 from typing import Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,6 +17,7 @@ class DatabaseManager:
     def __init__(self):
         self.connection = None
         self.cursor = None
+        self.prepared_statements = set()
     
     async def connect(self):
         """Connect to the database"""
@@ -37,6 +40,7 @@ class DatabaseManager:
                 password=parsed.password
             )
             self.cursor = self.connection.cursor(cursor_factory=RealDictCursor)
+            self.prepared_statements = set()
             print("✅ Connected to database")
         except Exception as e:
             print(f"❌ Database connection failed: {e}")
@@ -49,7 +53,14 @@ class DatabaseManager:
         if self.connection:
             self.connection.close()
         print("✅ Disconnected from database")
-    
+
+    async def enable_bulk_mode(self, work_mem: str = '256MB'):
+        """Tune this session for bulk imports: async commits and a larger sort/hash budget"""
+        # A crash can lose the last few commits, but never corrupts data; imports can simply be rerun
+        self.cursor.execute("SET synchronous_commit = off")
+        self.cursor.execute("SET work_mem = %s", (work_mem,))
+        self.connection.commit()
+
     async def get_team_by_name(self, name: str) -> Optional[dict]:
         """Get team by name"""
         self.cursor.execute("SELECT * FROM teams WHERE name = %s", (name,))
@@ -79,7 +90,43 @@ class DatabaseManager:
         result = self.cursor.fetchone()
         self.connection.commit()
         return dict(result)
-    
+
+    async def bulk_create_teams(self, teams_list: list) -> list:
+        """Create any missing teams in one round-trip, returning only the newly inserted rows"""
+        if not teams_list:
+            return []
+
+        values_list = [
+            {
+                'name': team['name'],
+                'abbreviation': team['abbreviation'],
+                'city': team['city'],
+                'conference': team['conference'],
+                'division': team['division'],
+                'logoUrl': team.get('logoUrl'),
+            }
+            for team in teams_list
+        ]
+
+        query = """
+            INSERT INTO teams (id, name, abbreviation, city, conference, division, "logoUrl", "createdAt", "updatedAt")
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING id, name
+        """
+        template = """
+            (gen_random_uuid(), %(name)s, %(abbreviation)s, %(city)s, %(conference)s, %(division)s, %(logoUrl)s, NOW(), NOW())
+        """
+        # No conflict target: name and abbreviation are both unique, and a clash on either skips the row
+        try:
+            results = execute_values(self.cursor, query, values_list, template=template, fetch=True)
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            print(f"❌ Error creating teams: {e}")
+            raise
+        return [dict(row) for row in results]
+
     async def create_player(self, player_data: dict) -> dict:
         """Create a new player"""
         query = """
@@ -137,6 +184,58 @@ class DatabaseManager:
         self.connection.commit()
         return dict(result)
     
+    async def bulk_create_team_stats(self, stats_list: list, chunk_size: int = 5000) -> int:
+        """Bulk create team statistics with duplicate handling, one statement per chunk"""
+        if not stats_list:
+            return 0
+        
+        query = """
+            INSERT INTO team_stats (id, "teamId", season, "gamesPlayed", wins, losses, "pointsPerGame",
+                                   "pointsAllowed", "fieldGoalPct", "threePointPct", "freeThrowPct",
+                                   rebounds, assists, turnovers, steals, blocks, "createdAt", "updatedAt")
+            VALUES %s
+            ON CONFLICT ("teamId", season) DO UPDATE SET
+                "gamesPlayed" = EXCLUDED."gamesPlayed",
+                wins = EXCLUDED.wins,
+                losses = EXCLUDED.losses,
+                "pointsPerGame" = EXCLUDED."pointsPerGame",
+                "pointsAllowed" = EXCLUDED."pointsAllowed",
+                "fieldGoalPct" = EXCLUDED."fieldGoalPct",
+                "threePointPct" = EXCLUDED."threePointPct",
+                "freeThrowPct" = EXCLUDED."freeThrowPct",
+                rebounds = EXCLUDED.rebounds,
+                assists = EXCLUDED.assists,
+                turnovers = EXCLUDED.turnovers,
+                steals = EXCLUDED.steals,
+                blocks = EXCLUDED.blocks,
+                "updatedAt" = NOW()
+        """
+        template = """
+            (gen_random_uuid(), %(teamId)s, %(season)s, %(gamesPlayed)s, %(wins)s, %(losses)s, %(pointsPerGame)s,
+             %(pointsAllowed)s, %(fieldGoalPct)s, %(threePointPct)s, %(freeThrowPct)s,
+             %(rebounds)s, %(assists)s, %(turnovers)s, %(steals)s, %(blocks)s, NOW(), NOW())
+        """
+        
+        # One statement cannot upsert the same row twice, so keep the last row per key
+        deduped = {}
+        for stats in stats_list:
+            deduped[(stats['teamId'], stats['season'])] = stats
+        stats_list = list(deduped.values())
+        
+        for start in range(0, len(stats_list), chunk_size):
+            chunk = stats_list[start:start + chunk_size]
+            try:
+                execute_values(self.cursor, query, chunk, template=template, page_size=chunk_size)
+                self.connection.commit()
+            except Exception as e:
+                # Earlier chunks are already committed; only this one is discarded
+                self.connection.rollback()
+                print(f"❌ Error saving team stats {start + 1}-{start + len(chunk)}: {e}")
+                raise
+            print(f"✅ Saved {start + len(chunk)}/{len(stats_list)} team stats")
+        
+        return len(stats_list)
+    
     async def create_player_stats(self, stats_data: dict) -> dict:
         """Create player statistics"""
         query = """
@@ -171,7 +270,12 @@ class DatabaseManager:
         self.cursor.execute("SELECT * FROM teams")
         results = self.cursor.fetchall()
         return [dict(row) for row in results]
-    
+
+    async def get_existing_team_names(self) -> set:
+        """Get the names of all existing teams"""
+        self.cursor.execute("SELECT name FROM teams")
+        return {row['name'] for row in self.cursor.fetchall()}
+
     async def clear_teams(self):
         """Clear all teams from the database"""
         try:
@@ -194,6 +298,13 @@ class DatabaseManager:
         self.cursor.execute("SELECT * FROM players")
         results = self.cursor.fetchall()
         return [dict(row) for row in results]
+
+    async def get_player_name_mapping(self) -> dict:
+        """Get a player name -> id mapping"""
+        # Plain tuple cursor: dict() consumes the (name, id) pairs directly, no per-row dicts
+        with self.connection.cursor() as cursor:
+            cursor.execute("SELECT name, id FROM players")
+            return dict(cursor.fetchall())
     
     async def get_existing_games(self) -> list:
         """Get all existing games"""
@@ -201,64 +312,70 @@ class DatabaseManager:
         results = self.cursor.fetchall()
         return [dict(row) for row in results]
     
-    async def bulk_create_player_stats(self, stats_list: list) -> int:
-        """Bulk create player statistics"""
+    async def bulk_create_player_stats(self, stats_list: list, page_size: int = 1000) -> int:
+        """Bulk create player statistics, one multi-row INSERT per page"""
         if not stats_list:
             return 0
         
-        # Prepare the data for bulk insert (using snake_case column names)
-        columns = [
-            'playerId', 'season', 'gamesPlayed', 'minutesPerGame', 'pointsPerGame', 
-            'rebounds', 'assists', 'steals', 'blocks', 'turnovers', 
-            'fieldGoalPct', 'threePointPct', 'freeThrowPct', 'createdAt', 'updatedAt'
+        # Normalize rows so every template key is present
+        values_list = [
+            {
+                'playerId': stats.get('playerId'),
+                'season': stats.get('season'),
+                'seasonType': stats.get('seasonType', 'Regular Season'),
+                'gamesPlayed': stats.get('gamesPlayed', 0),
+                'minutesPerGame': stats.get('minutesPerGame', 0),
+                'pointsPerGame': stats.get('pointsPerGame', 0),
+                'rebounds': stats.get('rebounds', 0),
+                'assists': stats.get('assists', 0),
+                'steals': stats.get('steals', 0),
+                'blocks': stats.get('blocks', 0),
+                'turnovers': stats.get('turnovers', 0),
+                'fieldGoalPct': stats.get('fieldGoalPct', 0),
+                'threePointPct': stats.get('threePointPct', 0),
+                'freeThrowPct': stats.get('freeThrowPct', 0),
+            }
+            for stats in stats_list
         ]
         
-        # Create values list
-        values_list = []
-        for stats in stats_list:
-            values = [
-                stats.get('playerId'),
-                stats.get('season'),
-                stats.get('gamesPlayed', 0),
-                stats.get('minutesPerGame', 0),
-                stats.get('pointsPerGame', 0),
-                stats.get('rebounds', 0),
-                stats.get('assists', 0),
-                stats.get('steals', 0),
-                stats.get('blocks', 0),
-                stats.get('turnovers', 0),
-                stats.get('fieldGoalPct', 0),
-                stats.get('threePointPct', 0),
-                stats.get('freeThrowPct', 0),
-                'NOW()',
-                'NOW()'
-            ]
-            values_list.append(values)
+        # One statement cannot upsert the same row twice, so keep the last row per key
+        deduped = {}
+        for values in values_list:
+            deduped[(values['playerId'], values['season'], values['seasonType'])] = values
+        values_list = list(deduped.values())
         
-        # Create the bulk insert query with proper column quoting
-        quoted_columns = [f'"{col}"' for col in columns]
-        placeholders = ', '.join(['%s'] * len(columns))
-        query = f"""
-        INSERT INTO player_stats ({', '.join(quoted_columns)})
-        VALUES ({placeholders})
-        ON CONFLICT ("playerId", season) DO UPDATE SET
-            "gamesPlayed" = EXCLUDED."gamesPlayed",
-            "minutesPerGame" = EXCLUDED."minutesPerGame",
-            "pointsPerGame" = EXCLUDED."pointsPerGame",
-            "rebounds" = EXCLUDED."rebounds",
-            "assists" = EXCLUDED."assists",
-            "steals" = EXCLUDED."steals",
-            "blocks" = EXCLUDED."blocks",
-            "turnovers" = EXCLUDED."turnovers",
-            "fieldGoalPct" = EXCLUDED."fieldGoalPct",
-            "threePointPct" = EXCLUDED."threePointPct",
-            "freeThrowPct" = EXCLUDED."freeThrowPct",
-            "updatedAt" = NOW()
+        query = """
+            INSERT INTO player_stats (id, "playerId", season, "seasonType", "gamesPlayed", "minutesPerGame", "pointsPerGame",
+                                     rebounds, assists, steals, blocks, turnovers, "fieldGoalPct",
+                                     "threePointPct", "freeThrowPct", "createdAt", "updatedAt")
+            VALUES %s
+            ON CONFLICT ("playerId", season, "seasonType") DO UPDATE SET
+                "gamesPlayed" = EXCLUDED."gamesPlayed",
+                "minutesPerGame" = EXCLUDED."minutesPerGame",
+                "pointsPerGame" = EXCLUDED."pointsPerGame",
+                rebounds = EXCLUDED.rebounds,
+                assists = EXCLUDED.assists,
+                steals = EXCLUDED.steals,
+                blocks = EXCLUDED.blocks,
+                turnovers = EXCLUDED.turnovers,
+                "fieldGoalPct" = EXCLUDED."fieldGoalPct",
+                "threePointPct" = EXCLUDED."threePointPct",
+                "freeThrowPct" = EXCLUDED."freeThrowPct",
+                "updatedAt" = NOW()
+        """
+        template = """
+            (gen_random_uuid(), %(playerId)s, %(season)s, %(seasonType)s, %(gamesPlayed)s, %(minutesPerGame)s, %(pointsPerGame)s,
+             %(rebounds)s, %(assists)s, %(steals)s, %(blocks)s, %(turnovers)s, %(fieldGoalPct)s,
+             %(threePointPct)s, %(freeThrowPct)s, NOW(), NOW())
         """
         
-        # Execute bulk insert
-        self.cursor.executemany(query, values_list)
-        await self.connection.commit()
+        try:
+            execute_values(self.cursor, query, values_list, template=template, page_size=page_size)
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            print(f"❌ Error saving player stats: {e}")
+            raise
         
         return len(values_list)
     
@@ -275,6 +392,37 @@ class DatabaseManager:
         except Exception as e:
             print(f"❌ Error executing query: {e}")
             return []
+
+    async def prepare(self, name: str, query: str):
+        """Parse and plan a statement once per connection; query uses $1, $2, ... placeholders"""
+        if name in self.prepared_statements:
+            return
+        self.cursor.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(name)) + sql.SQL(query))
+        self.prepared_statements.add(name)
+
+    async def execute_prepared(self, name: str, params: list = None) -> list:
+        """Execute a statement registered with prepare(); returns rows, or [] for writes without RETURNING (caller commits)"""
+        statement = sql.SQL("EXECUTE {}").format(sql.Identifier(name))
+        if params:
+            placeholders = sql.SQL(', ').join(sql.Placeholder() * len(params))
+            statement += sql.SQL(" ({})").format(placeholders)
+        self.cursor.execute(statement, params or None)
+        if self.cursor.description is None:
+            return []
+        return [dict(row) for row in self.cursor.fetchall()]
+
+    async def stream(self, query: str, params: list = None, itersize: int = 1000):
+        """Stream query results through a server-side cursor, itersize rows per network fetch"""
+        # Named cursors live on the server, so large result sets are never buffered client-side.
+        # WITH HOLD keeps the cursor open across the commit() every write method issues on this
+        # same connection, so callers can upsert while iterating; the with block closes it.
+        # A rollback still discards it.
+        with self.connection.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor,
+                                    withhold=True) as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            for row in cursor:
+                yield dict(row)
     
     async def get_game_by_teams_and_date(self, home_team_id: str, away_team_id: str, game_date) -> Optional[dict]:
         """Get game by teams and date"""
@@ -300,4 +448,15 @@ class DatabaseManager:
         self.cursor.execute(query, stats_data)
         result = self.cursor.fetchone()
         self.connection.commit()
-        return dict(result)
\ No newline at end of file
+        return dict(result)
+
+_shared_db_manager: Optional[DatabaseManager] = None
+
+async def get_db_manager() -> DatabaseManager:
+    """Get the process-wide DatabaseManager, connecting on first use or after the connection drops"""
+    global _shared_db_manager
+    if _shared_db_manager is None:
+        _shared_db_manager = DatabaseManager()
+    if _shared_db_manager.connection is None or _shared_db_manager.connection.closed:
+        await _shared_db_manager.connect()
+    return _shared_db_manager
@@ -2,13 +2,78 @@
 Feature Engineering Module for NBA Player Performance Prediction
 Implements the 6 key features for predicting NBA player game performance
 """
-import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 import asyncio
+from dataclasses import dataclass
 from .database import DatabaseManager
 
+# Per-game stat columns used by the recent performance features, in output order
+_STAT_COLS = [
+    'points',
+    'assists',
+    'reboundsTotal',
+    'numMinutes',
+    'fieldGoalsPercentage',
+    'threePointersPercentage',
+    'freeThrowsPercentage',
+]
+
+# Layout of the Feature 1 columns of the feature matrix
+_RECENT_FEATURE_NAMES = (
+    'recent_points_avg',
+    'recent_points_std',
+    'recent_assists_avg',
+    'recent_assists_std',
+    'recent_rebounds_avg',
+    'recent_rebounds_std',
+    'recent_minutes_avg',
+    'recent_minutes_std',
+    'recent_fg_pct_avg',
+    'recent_three_pct_avg',
+    'recent_ft_pct_avg',
+    'recent_games_count',
+    'recent_win_rate',
+    'points_trend',
+    'assists_trend',
+    'rebounds_trend',
+)
+
+# Slots of _RECENT_FEATURE_NAMES holding the average of each _STAT_COLS column
+_RECENT_AVG_SLOTS = [0, 2, 4, 6, 8, 9, 10]
+
+
+@dataclass
+class FeatureContext:
+    """Inputs shared by all feature sets for a batch of players on one game date"""
+    # (n_players, 8): season averages laid out as _STAT_COLS followed by win
+    recent_stats: np.ndarray
+    # (n_players,): whether recent_stats holds data for the player
+    has_recent: np.ndarray
+
+
+# Season strings keyed by the season's start year, e.g. 2024 -> '2024-25'
+_SEASON_CACHE: Dict[int, str] = {}
+
+
+def _season_for_date(game_date: datetime) -> str:
+    """Get the NBA season string for a date (seasons start in October)"""
+    start_year = game_date.year if game_date.month >= 10 else game_date.year - 1
+    season = _SEASON_CACHE.get(start_year)
+    if season is None:
+        season = f"{start_year}-{(start_year + 1) % 100:02d}"
+        _SEASON_CACHE[start_year] = season
+    return season
+
+
+def _feature_row_dict(row: np.ndarray, names: Tuple[str, ...]) -> Dict[str, float]:
+    """Turn one row of the feature matrix into a feature dict"""
+    features = dict(zip(names, row.tolist()))
+    features['recent_games_count'] = int(features['recent_games_count'])
+    return features
+
+
 class FeatureEngineer:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
@@ -28,128 +93,14 @@ class FeatureEngineer:
             Dictionary with recent performance features
         """
         try:
-            # Get player's recent games before the target date
-            recent_games = await self._get_player_recent_games(player_id, game_date, lookback_games)
-            
-            if len(recent_games) == 0:
-                return self._get_default_recent_performance_features()
-            
-            # Calculate rolling averages for key stats
-            features = {}
-            
-            # Points rolling average
-            points = recent_games['points'].values
-            features['recent_points_avg'] = np.mean(points)
-            features['recent_points_std'] = np.std(points) if len(points) > 1 else 0.0
-            
-            # Assists rolling average
-            assists = recent_games['assists'].values
-            features['recent_assists_avg'] = np.mean(assists)
-            features['recent_assists_std'] = np.std(assists) if len(assists) > 1 else 0.0
-            
-            # Rebounds rolling average
-            rebounds = recent_games['reboundsTotal'].values
-            features['recent_rebounds_avg'] = np.mean(rebounds)
-            features['recent_rebounds_std'] = np.std(rebounds) if len(rebounds) > 1 else 0.0
-            
-            # Minutes played rolling average
-            minutes = recent_games['numMinutes'].values
-            features['recent_minutes_avg'] = np.mean(minutes)
-            features['recent_minutes_std'] = np.std(minutes) if len(minutes) > 1 else 0.0
-            
-            # Shooting percentages
-            fg_pct = recent_games['fieldGoalsPercentage'].values
-            features['recent_fg_pct_avg'] = np.mean(fg_pct)
-            
-            three_pct = recent_games['threePointersPercentage'].values
-            features['recent_three_pct_avg'] = np.mean(three_pct)
-            
-            ft_pct = recent_games['freeThrowsPercentage'].values
-            features['recent_ft_pct_avg'] = np.mean(ft_pct)
-            
-            # Additional performance indicators
-            features['recent_games_count'] = len(recent_games)
-            features['recent_win_rate'] = recent_games['win'].mean() if 'win' in recent_games.columns else 0.0
-            
-            # Trend indicators (comparing first half vs second half of recent games)
-            if len(recent_games) >= 4:
-                mid_point = len(recent_games) // 2
-                recent_half = recent_games.iloc[:mid_point]
-                older_half = recent_games.iloc[mid_point:]
-                
-                features['points_trend'] = recent_half['points'].mean() - older_half['points'].mean()
-                features['assists_trend'] = recent_half['assists'].mean() - older_half['assists'].mean()
-                features['rebounds_trend'] = recent_half['reboundsTotal'].mean() - older_half['reboundsTotal'].mean()
-            else:
-                features['points_trend'] = 0.0
-                features['assists_trend'] = 0.0
-                features['rebounds_trend'] = 0.0
-            
-            return features
+            # Same code path as the batch computation, so the two can never disagree
+            features_out, names = await self.compute_features_batch([player_id], game_date, lookback_games)
+            return _feature_row_dict(features_out[0], names)
             
         except Exception as e:
             print(f"❌ Error computing recent performance features for player {player_id}: {e}")
             return self._get_default_recent_performance_features()
     
-    async def _get_player_recent_games(self, player_id: str, game_date: datetime, 
-                                     lookback_games: int) -> pd.DataFrame:
-        """Get player's recent games before a specific date"""
-        try:
-            # Since player_stats doesn't have individual game records, we need to work differently
-            # For now, let's get the player's season averages as a fallback
-            # In a real implementation, you'd need individual game records
-            
-            query = """
-            SELECT 
-                "pointsPerGame" as points,
-                assists,
-                rebounds,
-                "minutesPerGame" as numMinutes,
-                "fieldGoalPct" as fieldGoalsPercentage,
-                "threePointPct" as threePointersPercentage,
-                "freeThrowPct" as freeThrowsPercentage,
-                steals,
-                blocks,
-                turnovers,
-                0 as plusMinusPoints,
-                NOW() as gameDate,
-                '' as homeTeamId,
-                '' as awayTeamId,
-                0 as homeScore,
-                0 as awayScore,
-                0.5 as win
-            FROM player_stats 
-            WHERE "playerId" = %s 
-            AND season = %s
-            ORDER BY "createdAt" DESC
-            LIMIT 1
-            """
-            
-            # Get current season (simplified)
-            current_year = game_date.year
-            if game_date.month >= 10:  # NBA season starts in October
-                season = f"{current_year}-{str(current_year + 1)[2:]}"
-            else:
-                season = f"{current_year - 1}-{str(current_year)[2:]}"
-            
-            # Execute the query using the database manager
-            result = await self.db.execute_query(query, [player_id, season])
-            
-            if result:
-                # For demonstration, create multiple rows with the same data
-                # In reality, you'd need individual game records
-                df = pd.DataFrame(result)
-                if not df.empty:
-                    # Replicate the row to simulate multiple games
-                    df = pd.concat([df] * min(lookback_games, 3), ignore_index=True)
-                return df
-            else:
-                return pd.DataFrame()
-            
-        except Exception as e:
-            print(f"❌ Error fetching recent games for player {player_id}: {e}")
-            return pd.DataFrame()
-    
     def _get_default_recent_performance_features(self) -> Dict[str, float]:
         """Return default values when no recent games are available"""
         return {
@@ -185,11 +136,28 @@ class FeatureEngineer:
         Returns:
             Dictionary with all computed features
         """
-        features = {}
+        features_out, names = await self.compute_features_batch([player_id], game_date)
+        return _feature_row_dict(features_out[0], names)
+    
+    async def compute_features_batch(self, player_ids: List[str], game_date: datetime,
+                                     lookback_games: int = 5) -> Tuple[np.ndarray, Tuple[str, ...]]:
+        """
+        Compute all feature sets for many players with one data fetch
+        
+        Args:
+            player_ids: Player IDs to compute features for
+            game_date: Date of the game
+            lookback_games: Number of recent games to look back (default 5)
+            
+        Returns:
+            Tuple of (features_out, feature_names) where features_out has shape
+            (len(player_ids), len(feature_names))
+        """
+        ctx = await self._fetch_feature_inputs(player_ids, game_date)
+        features_out = np.zeros((len(player_ids), len(_RECENT_FEATURE_NAMES)))
         
         # Feature 1: Recent Player Performance
-        recent_perf = await self.compute_recent_performance_features(player_id, game_date)
-        features.update(recent_perf)
+        self._fill_recent_performance(ctx, features_out, lookback_games)
         
         # TODO: Implement other features
         # Feature 2: Opponent Defensive Strength
@@ -198,4 +166,56 @@ class FeatureEngineer:
         # Feature 5: Rest Days
         # Feature 6: Game Context
         
-        return features
+        return features_out, _RECENT_FEATURE_NAMES
+    
+    async def _fetch_feature_inputs(self, player_ids: List[str], game_date: datetime) -> FeatureContext:
+        """Fetch the inputs for every feature set in a single round-trip"""
+        season = _season_for_date(game_date)
+        recent_stats = np.zeros((len(player_ids), len(_STAT_COLS) + 1))
+        has_recent = np.zeros(len(player_ids), dtype=bool)
+        
+        query = """
+        SELECT DISTINCT ON ("playerId")
+            "playerId",
+            "pointsPerGame" as points,
+            assists,
+            rebounds as "reboundsTotal",
+            "minutesPerGame" as "numMinutes",
+            "fieldGoalPct" as "fieldGoalsPercentage",
+            "threePointPct" as "threePointersPercentage",
+            "freeThrowPct" as "freeThrowsPercentage",
+            0.5 as win
+        FROM player_stats
+        WHERE "playerId" = ANY(%s)
+        AND season = %s
+        ORDER BY "playerId", "createdAt" DESC
+        """
+        # A player may appear more than once; fetch each once and fill every position
+        row_index: Dict[str, List[int]] = {}
+        for i, player_id in enumerate(player_ids):
+            row_index.setdefault(player_id, []).append(i)
+        
+        result = await self.db.execute_query(query, [list(row_index), season])
+        
+        for row in result:
+            positions = row_index.get(row['playerId'])
+            if positions is None:
+                continue
+            recent_stats[positions, :-1] = [row[col] for col in _STAT_COLS]
+            recent_stats[positions, -1] = row['win']
+            has_recent[positions] = True
+        
+        return FeatureContext(
+            recent_stats=recent_stats,
+            has_recent=has_recent,
+        )
+    
+    def _fill_recent_performance(self, ctx: FeatureContext, features_out: np.ndarray,
+                                 lookback_games: int):
+        """Write Feature 1 columns for every player in ctx into features_out"""
+        # Players without data keep the zero defaults. Season-average rows stand
+        # in for identical games, so stds and trends stay zero as well.
+        rows = ctx.has_recent
+        features_out[np.ix_(rows, _RECENT_AVG_SLOTS)] = ctx.recent_stats[rows, :-1]
+        features_out[rows, _RECENT_FEATURE_NAMES.index('recent_games_count')] = min(lookback_games, 3)
+        features_out[rows, _RECENT_FEATURE_NAMES.index('recent_win_rate')] = ctx.recent_stats[rows, -1]
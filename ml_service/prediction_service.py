@@ -1,4 +1,5 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
@@ -18,11 +19,22 @@ app = FastAPI(title="NBA Betting ML Service", version="1.0.0")
 model = None
 scaler = None
 model_metadata = None
+feature_columns = ()  # model_metadata['feature_columns'] as a tuple, in training order
+
+# Shared SQLAlchemy engine (connection pool), created on first use
+_engine = None
 
 class PredictionRequest(BaseModel):
     game_id: str
     features: dict
 
+class VectorPredictionRequest(BaseModel):
+    game_id: str
+    feature_vector: list[float]  # already in feature_columns order
+
+class BatchPredictionRequest(BaseModel):
+    games: list[PredictionRequest]
+
 class PredictionResponse(BaseModel):
     game_id: str
     predicted_class: int
@@ -32,16 +44,23 @@ class PredictionResponse(BaseModel):
 
 def load_model():
     """Load the trained model and scaler"""
-    global model, scaler, model_metadata
+    global model, scaler, model_metadata, feature_columns
     
     if model is None:
         try:
             model = joblib.load('best_advanced_model.pkl')
             scaler = joblib.load('feature_scaler_advanced.pkl')
             
+            # Tree ensembles and XGBoost evaluate in float32 anyway; keeping the scaler in
+            # float32 lets float32 inputs pass straight through without upcasts or copies
+            for attr in ('mean_', 'scale_', 'var_'):
+                if getattr(scaler, attr, None) is not None:
+                    setattr(scaler, attr, getattr(scaler, attr).astype(np.float32))
+            
             import json
             with open('model_metadata.json', 'r') as f:
                 model_metadata = json.load(f)
+            feature_columns = tuple(model_metadata['feature_columns'])
                 
             print("✅ Model loaded successfully")
         except Exception as e:
@@ -49,145 +68,143 @@ def load_model():
             raise e
 
 def get_database_connection():
-    """Get database connection"""
-    database_url = os.getenv('DATABASE_URL')
-    if not database_url:
-        raise ValueError("DATABASE_URL not found in environment variables")
-    
-    if database_url.startswith('postgresql://'):
-        database_url = database_url.replace('postgresql://', 'postgresql+psycopg2://')
-    
-    return create_engine(database_url)
-
-def calculate_win_rate(games_df, team_id):
-    """Calculate win rate for a team"""
-    if len(games_df) == 0:
-        return 0.5
-    
-    wins = 0
-    for _, game in games_df.iterrows():
-        if game['homeTeamId'] == team_id:
-            wins += 1 if game['homeScore'] > game['awayScore'] else 0
-        else:
-            wins += 1 if game['awayScore'] > game['homeScore'] else 0
-    
-    return wins / len(games_df)
-
-def calculate_points_for(games_df, team_id):
-    """Calculate average points scored by a team"""
-    if len(games_df) == 0:
-        return 0
-    
-    total_points = 0
-    for _, game in games_df.iterrows():
-        if game['homeTeamId'] == team_id:
-            total_points += game['homeScore']
-        else:
-            total_points += game['awayScore']
-    
-    return total_points / len(games_df)
-
-def calculate_points_against(games_df, team_id):
-    """Calculate average points allowed by a team"""
-    if len(games_df) == 0:
-        return 0
+    """Get the shared database engine, creating its connection pool on first use"""
+    global _engine
     
-    total_points = 0
-    for _, game in games_df.iterrows():
-        if game['homeTeamId'] == team_id:
-            total_points += game['awayScore']
-        else:
-            total_points += game['homeScore']
+    if _engine is None:
+        database_url = os.getenv('DATABASE_URL')
+        if not database_url:
+            raise ValueError("DATABASE_URL not found in environment variables")
+        
+        if database_url.startswith('postgresql://'):
+            database_url = database_url.replace('postgresql://', 'postgresql+psycopg2://')
+        
+        _engine = create_engine(database_url, pool_pre_ping=True, pool_size=10)
     
-    return total_points / len(games_df)
-
-def calculate_point_differential(games_df, team_id):
-    """Calculate point differential for a team"""
-    return calculate_points_for(games_df, team_id) - calculate_points_against(games_df, team_id)
-
-def calculate_recent_form(games_df, team_id, num_games):
-    """Calculate recent form (win rate in last N games)"""
-    recent_games = games_df.head(num_games)
-    return calculate_win_rate(recent_games, team_id)
+    return _engine
 
-def calculate_rest_days(games_df, team_id, game_date):
-    """Calculate rest days since last game"""
-    if len(games_df) == 0:
-        return 7
+def summarize_team_form(form_df, side, game_date):
+    """Unpack one team's aggregate row into (win rate, points for, points against, recent form, rest days)"""
+    if side not in form_df.index:
+        # No completed games before this one
+        return 0.5, 0, 0, 0.5, 7
     
-    last_game = games_df.iloc[0]
-    time_diff = game_date - last_game['gameDate']
-    return time_diff.days
+    row = form_df.loc[side]
+    rest_days = (game_date - row['last_game_date']).days
+    return float(row['win_rate']), float(row['points_for']), float(row['points_against']), float(row['recent_form_5']), rest_days
 
 def calculate_season_progress(game_date, season):
     """Calculate season progress (0-1)"""
-    try:
-        year = int(season.split('-')[0])
-        season_start = datetime(year, 10, 1)
-        season_end = datetime(year + 1, 6, 30)
-        
-        total_days = (season_end - season_start).days
-        days_elapsed = (game_date - season_start).days
-        
-        return max(0, min(1, days_elapsed / total_days))
-    except:
+    start_year = season[:4] if isinstance(season, str) else ''
+    if game_date is None or not start_year.isdigit():
         return 0.5
+    
+    year = int(start_year)
+    season_start = datetime(year, 10, 1)
+    season_end = datetime(year + 1, 6, 30)
+    
+    total_days = (season_end - season_start).days
+    days_elapsed = (game_date - season_start).days
+    
+    return max(0, min(1, days_elapsed / total_days))
 
-async def generate_game_features(game_data):
-    """Generate features for a game"""
+def generate_game_features(game_data):
+    """Generate features for a game (blocking; run it in the threadpool from async routes)"""
     try:
         engine = get_database_connection()
         
-        # Get historical data for both teams
-        home_history_query = """
-        SELECT 
-            "gameDate",
-            "homeTeamId",
-            "awayTeamId",
-            "homeScore",
-            "awayScore"
-        FROM games
-        WHERE ("homeTeamId" = %(team_id)s OR "awayTeamId" = %(team_id)s)
-        AND "gameDate" < %(game_date)s
-        AND "homeScore" IS NOT NULL
-        AND "awayScore" IS NOT NULL
-        ORDER BY "gameDate" DESC
-        LIMIT 10
+        # Aggregate each team's last 10 games in the database: one round-trip, one row per team
+        form_query = """
+        WITH candidates AS (
+            -- One branch per (team, venue) so each is an index range scan on
+            -- ("<venue>TeamId", "gameDate" DESC) that stops after 10 rows
+            (SELECT 'home' AS side, "gameDate", "homeScore" AS points_for, "awayScore" AS points_against
+             FROM games
+             WHERE "homeTeamId" = %(home_team_id)s
+             AND "gameDate" < %(game_date)s
+             AND "homeScore" IS NOT NULL
+             AND "awayScore" IS NOT NULL
+             ORDER BY "gameDate" DESC
+             LIMIT 10)
+            UNION ALL
+            (SELECT 'home' AS side, "gameDate", "awayScore" AS points_for, "homeScore" AS points_against
+             FROM games
+             WHERE "awayTeamId" = %(home_team_id)s
+             AND "gameDate" < %(game_date)s
+             AND "homeScore" IS NOT NULL
+             AND "awayScore" IS NOT NULL
+             ORDER BY "gameDate" DESC
+             LIMIT 10)
+            UNION ALL
+            (SELECT 'away' AS side, "gameDate", "homeScore" AS points_for, "awayScore" AS points_against
+             FROM games
+             WHERE "homeTeamId" = %(away_team_id)s
+             AND "gameDate" < %(game_date)s
+             AND "homeScore" IS NOT NULL
+             AND "awayScore" IS NOT NULL
+             ORDER BY "gameDate" DESC
+             LIMIT 10)
+            UNION ALL
+            (SELECT 'away' AS side, "gameDate", "awayScore" AS points_for, "homeScore" AS points_against
+             FROM games
+             WHERE "awayTeamId" = %(away_team_id)s
+             AND "gameDate" < %(game_date)s
+             AND "homeScore" IS NOT NULL
+             AND "awayScore" IS NOT NULL
+             ORDER BY "gameDate" DESC
+             LIMIT 10)
+        ), ranked AS (
+            SELECT *, ROW_NUMBER() OVER (PARTITION BY side ORDER BY "gameDate" DESC) AS game_rank
+            FROM candidates
+        ), recent AS (
+            SELECT * FROM ranked WHERE game_rank <= 10
+        )
+        SELECT
+            side,
+            AVG(CASE WHEN points_for > points_against THEN 1.0 ELSE 0.0 END)::float AS win_rate,
+            AVG(points_for)::float AS points_for,
+            AVG(points_against)::float AS points_against,
+            (AVG(CASE WHEN points_for > points_against THEN 1.0 ELSE 0.0 END) FILTER (WHERE game_rank <= 5))::float AS recent_form_5,
+            MAX("gameDate") AS last_game_date
+        FROM recent
+        GROUP BY side
         """
         
-        home_history = pd.read_sql(home_history_query, engine, params={
-            'team_id': game_data['homeTeamId'], 
+        form = pd.read_sql(form_query, engine, params={
+            'home_team_id': game_data['homeTeamId'],
+            'away_team_id': game_data['awayTeamId'],
             'game_date': game_data['gameDate']
-        })
+        }).set_index('side')
         
-        away_history = pd.read_sql(home_history_query, engine, params={
-            'team_id': game_data['awayTeamId'], 
-            'game_date': game_data['gameDate']
-        })
+        home_win_rate, home_points_for, home_points_against, home_recent_form, home_rest_days = \
+            summarize_team_form(form, 'home', game_data['gameDate'])
+        away_win_rate, away_points_for, away_points_against, away_recent_form, away_rest_days = \
+            summarize_team_form(form, 'away', game_data['gameDate'])
+        home_point_differential = home_points_for - home_points_against
+        away_point_differential = away_points_for - away_points_against
         
-        # Calculate features
         features = {
             'spread': game_data['spread'] or 0,
             'total': game_data['total'] or 0,
-            'home_win_rate': calculate_win_rate(home_history, game_data['homeTeamId']),
-            'away_win_rate': calculate_win_rate(away_history, game_data['awayTeamId']),
-            'home_points_for': calculate_points_for(home_history, game_data['homeTeamId']),
-            'away_points_for': calculate_points_for(away_history, game_data['awayTeamId']),
-            'home_points_against': calculate_points_against(home_history, game_data['homeTeamId']),
-            'away_points_against': calculate_points_against(away_history, game_data['awayTeamId']),
-            'home_point_differential': calculate_point_differential(home_history, game_data['homeTeamId']),
-            'away_point_differential': calculate_point_differential(away_history, game_data['awayTeamId']),
-            'home_recent_form_5': calculate_recent_form(home_history, game_data['homeTeamId'], 5),
-            'away_recent_form_5': calculate_recent_form(away_history, game_data['awayTeamId'], 5),
-            'home_rest_days': calculate_rest_days(home_history, game_data['homeTeamId'], game_data['gameDate']),
-            'away_rest_days': calculate_rest_days(away_history, game_data['awayTeamId'], game_data['gameDate']),
+            'home_win_rate': home_win_rate,
+            'away_win_rate': away_win_rate,
+            'home_points_for': home_points_for,
+            'away_points_for': away_points_for,
+            'home_points_against': home_points_against,
+            'away_points_against': away_points_against,
+            'home_point_differential': home_point_differential,
+            'away_point_differential': away_point_differential,
+            'home_recent_form_5': home_recent_form,
+            'away_recent_form_5': away_recent_form,
+            'home_rest_days': home_rest_days,
+            'away_rest_days': away_rest_days,
             'h2h_games': 0,  # Simplified for now
             'h2h_home_wins': 0,
             'h2h_away_wins': 0,
-            'win_rate_difference': calculate_win_rate(home_history, game_data['homeTeamId']) - calculate_win_rate(away_history, game_data['awayTeamId']),
-            'point_differential_difference': calculate_point_differential(home_history, game_data['homeTeamId']) - calculate_point_differential(away_history, game_data['awayTeamId']),
-            'recent_form_difference': calculate_recent_form(home_history, game_data['homeTeamId'], 5) - calculate_recent_form(away_history, game_data['awayTeamId'], 5),
-            'rest_days_difference': calculate_rest_days(home_history, game_data['homeTeamId'], game_data['gameDate']) - calculate_rest_days(away_history, game_data['awayTeamId'], game_data['gameDate']),
+            'win_rate_difference': home_win_rate - away_win_rate,
+            'point_differential_difference': home_point_differential - away_point_differential,
+            'recent_form_difference': home_recent_form - away_recent_form,
+            'rest_days_difference': home_rest_days - away_rest_days,
             'season_progress': calculate_season_progress(game_data['gameDate'], game_data['season']),
             'is_playoffs': game_data['seasonType'] == 'Playoffs',
             'is_regular_season': game_data['seasonType'] == 'Regular Season',
@@ -204,6 +221,30 @@ async def generate_game_features(game_data):
         print(f"Error generating features: {e}")
         return None
 
+def build_prediction_response(game_id, predicted_class, probabilities):
+    """Build the API response and betting recommendation for one prediction"""
+    confidence = float(np.max(probabilities))
+    
+    # Generate recommendation
+    threshold = model_metadata['best_threshold']
+    should_bet = confidence >= threshold
+    bet_type = "Favorite Covers" if predicted_class == 1 else "Underdog Covers"
+    
+    recommendation = {
+        "should_bet": should_bet,
+        "bet_type": bet_type if should_bet else None,
+        "confidence": confidence,
+        "recommendation": f"Bet on {bet_type}" if should_bet else f"No bet - Confidence too low ({confidence:.1%} < {threshold:.1%})"
+    }
+    
+    return PredictionResponse(
+        game_id=game_id,
+        predicted_class=int(predicted_class),
+        confidence=confidence,
+        probabilities=probabilities.tolist(),
+        recommendation=recommendation
+    )
+
 @app.on_event("startup")
 async def startup_event():
     """Load model on startup"""
@@ -222,47 +263,86 @@ async def health_check():
     }
 
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(request: PredictionRequest):
-    """Make a prediction for a game"""
+def predict(request: PredictionRequest):
+    """Make a prediction for a game (sync, so FastAPI runs the CPU-bound inference in its threadpool)"""
     try:
         if model is None:
             load_model()
         
         # Convert features to array in the correct order
-        feature_array = [request.features.get(col, 0) for col in model_metadata['feature_columns']]
+        feature_array = [request.features.get(col, 0) for col in feature_columns]
         
         # Scale features
-        scaled_features = scaler.transform([feature_array])
+        scaled_features = scaler.transform(np.asarray([feature_array], dtype=np.float32))
         
         # Make prediction
-        predicted_class = model.predict(scaled_features)[0]
+        # predict() is just the argmax of predict_proba, so run inference once
         probabilities = model.predict_proba(scaled_features)[0]
-        confidence = float(np.max(probabilities))
-        
-        # Generate recommendation
-        threshold = model_metadata['best_threshold']
-        should_bet = confidence >= threshold
-        bet_type = "Favorite Covers" if predicted_class == 1 else "Underdog Covers"
-        
-        recommendation = {
-            "should_bet": should_bet,
-            "bet_type": bet_type if should_bet else None,
-            "confidence": confidence,
-            "recommendation": f"Bet on {bet_type}" if should_bet else f"No bet - Confidence too low ({confidence:.1%} < {threshold:.1%})"
-        }
+        predicted_class = model.classes_[np.argmax(probabilities)]
         
-        return PredictionResponse(
-            game_id=request.game_id,
-            predicted_class=int(predicted_class),
-            confidence=confidence,
-            probabilities=probabilities.tolist(),
-            recommendation=recommendation
-        )
+        return build_prediction_response(request.game_id, predicted_class, probabilities)
         
     except Exception as e:
         print(f"Prediction error: {e}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/predict-vector", response_model=PredictionResponse)
+def predict_vector(request: VectorPredictionRequest):
+    """Make a prediction from a feature vector already in training column order"""
+    try:
+        if model is None:
+            load_model()
+        
+        if len(request.feature_vector) != len(feature_columns):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Expected {len(feature_columns)} features, got {len(request.feature_vector)}"
+            )
+        
+        scaled_features = scaler.transform(np.asarray(request.feature_vector, dtype=np.float32).reshape(1, -1))
+        
+        # predict() is just the argmax of predict_proba, so run inference once
+        probabilities = model.predict_proba(scaled_features)[0]
+        predicted_class = model.classes_[np.argmax(probabilities)]
+        
+        return build_prediction_response(request.game_id, predicted_class, probabilities)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Prediction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+@app.post("/predict-batch", response_model=list[PredictionResponse])
+def predict_batch(request: BatchPredictionRequest):
+    """Make predictions for several games with one scaler/model call"""
+    try:
+        if model is None:
+            load_model()
+        
+        if not request.games:
+            return []
+        
+        # One row per game, columns in the order the model was trained on
+        feature_matrix = np.array(
+            [[game.features.get(col, 0) for col in feature_columns] for game in request.games],
+            dtype=np.float32
+        )
+        
+        scaled_features = scaler.transform(feature_matrix)
+        # predict() is just the argmax of predict_proba, so run inference once
+        probabilities = model.predict_proba(scaled_features)
+        predicted_classes = model.classes_[np.argmax(probabilities, axis=1)]
+        
+        return [
+            build_prediction_response(game.game_id, predicted_class, game_probabilities)
+            for game, predicted_class, game_probabilities in zip(request.games, predicted_classes, probabilities)
+        ]
+        
+    except Exception as e:
+        print(f"Batch prediction error: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
 @app.post("/predict-game/{game_id}")
 async def predict_game(game_id: str):
     """Generate features and predict for a specific game"""
@@ -287,7 +367,7 @@ async def predict_game(game_id: str):
         WHERE g.id = %(game_id)s
         """
         
-        game_data = pd.read_sql(game_query, engine, params={'game_id': game_id})
+        game_data = await run_in_threadpool(pd.read_sql, game_query, engine, params={'game_id': game_id})
         
         if game_data.empty:
             raise HTTPException(status_code=404, detail="Game not found")
@@ -295,7 +375,7 @@ async def predict_game(game_id: str):
         game = game_data.iloc[0].to_dict()
         
         # Generate features
-        features = await generate_game_features(game)
+        features = await run_in_threadpool(generate_game_features, game)
         
         if features is None:
             raise HTTPException(status_code=400, detail="Unable to generate features")
@@ -306,7 +386,7 @@ async def predict_game(game_id: str):
             features=features
         )
         
-        return await predict(prediction_request)
+        return await run_in_threadpool(predict, prediction_request)
         
     except Exception as e:
         print(f"Game prediction error: {e}")
@@ -94,7 +94,8 @@ def create_advanced_ml_models():
         spreads_clean = spreads[non_push_mask]
         
         print(f"After removing push games: {len(X_clean)} games")
-        print(f"Target distribution: {y_clean.value_counts().to_dict()}")
+        target_counts = np.bincount(y_clean.to_numpy(dtype=np.int64), minlength=2)
+        print(f"Target distribution: {dict(enumerate(target_counts.tolist()))}")
         
         # 3. Time-based split (more realistic for betting)
         # Use first 70% for training, last 30% for testing
@@ -9,6 +9,9 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Game scores are NOT NULL in every history query below, so they can be narrowed safely
+_SCORE_DTYPES = {'homeScore': 'int16', 'awayScore': 'int16'}
+
 def get_database_connection():
     """Get database connection using environment variables"""
     database_url = os.getenv('DATABASE_URL')
@@ -90,6 +93,16 @@ def create_ml_features_sample(sample_size=10000):
             # Get head-to-head history (last 5 games)
             h2h_history = get_head_to_head_history_simple(engine, game['homeTeamId'], game['awayTeamId'], game['game_date'], 5)
             
+            # Summarize each team's history once and reuse it for the derived features
+            home_win_rate, home_points_for, home_points_against, home_recent_form = \
+                summarize_team_history_simple(home_history, game['homeTeamId'])
+            away_win_rate, away_points_for, away_points_against, away_recent_form = \
+                summarize_team_history_simple(away_history, game['awayTeamId'])
+            home_point_differential = home_points_for - home_points_against
+            away_point_differential = away_points_for - away_points_against
+            home_rest_days = calculate_rest_days_simple(home_history, game['homeTeamId'], game['game_date'])
+            away_rest_days = calculate_rest_days_simple(away_history, game['awayTeamId'], game['game_date'])
+            
             # Calculate basic features
             features = {
                 # Basic game info
@@ -109,20 +122,20 @@ def create_ml_features_sample(sample_size=10000):
                 'id_total': game['idTotal'],
                 
                 # Home team features
-                'home_win_rate': calculate_win_rate_simple(home_history, game['homeTeamId']),
-                'home_points_for': calculate_points_for_simple(home_history, game['homeTeamId']),
-                'home_points_against': calculate_points_against_simple(home_history, game['homeTeamId']),
-                'home_point_differential': calculate_point_differential_simple(home_history, game['homeTeamId']),
-                'home_recent_form_5': calculate_recent_form_simple(home_history, game['homeTeamId'], 5),
-                'home_rest_days': calculate_rest_days_simple(home_history, game['homeTeamId'], game['game_date']),
+                'home_win_rate': home_win_rate,
+                'home_points_for': home_points_for,
+                'home_points_against': home_points_against,
+                'home_point_differential': home_point_differential,
+                'home_recent_form_5': home_recent_form,
+                'home_rest_days': home_rest_days,
                 
                 # Away team features
-                'away_win_rate': calculate_win_rate_simple(away_history, game['awayTeamId']),
-                'away_points_for': calculate_points_for_simple(away_history, game['awayTeamId']),
-                'away_points_against': calculate_points_against_simple(away_history, game['awayTeamId']),
-                'away_point_differential': calculate_point_differential_simple(away_history, game['awayTeamId']),
-                'away_recent_form_5': calculate_recent_form_simple(away_history, game['awayTeamId'], 5),
-                'away_rest_days': calculate_rest_days_simple(away_history, game['awayTeamId'], game['game_date']),
+                'away_win_rate': away_win_rate,
+                'away_points_for': away_points_for,
+                'away_points_against': away_points_against,
+                'away_point_differential': away_point_differential,
+                'away_recent_form_5': away_recent_form,
+                'away_rest_days': away_rest_days,
                 
                 # Head-to-head features
                 'h2h_games': len(h2h_history),
@@ -130,10 +143,10 @@ def create_ml_features_sample(sample_size=10000):
                 'h2h_away_wins': calculate_h2h_away_wins_simple(h2h_history, game['awayTeamId']),
                 
                 # Derived features
-                'win_rate_difference': calculate_win_rate_simple(home_history, game['homeTeamId']) - calculate_win_rate_simple(away_history, game['awayTeamId']),
-                'point_differential_difference': calculate_point_differential_simple(home_history, game['homeTeamId']) - calculate_point_differential_simple(away_history, game['awayTeamId']),
-                'recent_form_difference': calculate_recent_form_simple(home_history, game['homeTeamId'], 5) - calculate_recent_form_simple(away_history, game['awayTeamId'], 5),
-                'rest_days_difference': calculate_rest_days_simple(home_history, game['homeTeamId'], game['game_date']) - calculate_rest_days_simple(away_history, game['awayTeamId'], game['game_date']),
+                'win_rate_difference': home_win_rate - away_win_rate,
+                'point_differential_difference': home_point_differential - away_point_differential,
+                'recent_form_difference': home_recent_form - away_recent_form,
+                'rest_days_difference': home_rest_days - away_rest_days,
                 
                 # Season progression
                 'season_progress': calculate_season_progress_simple(game['game_date'], game['season']),
@@ -187,7 +200,9 @@ def get_team_history_simple(engine, team_id, game_date, limit=10):
     LIMIT %(limit)s
     """
     
-    return pd.read_sql(query, engine, params={'team_id': team_id, 'game_date': game_date, 'limit': limit})
+    history = pd.read_sql(query, engine, params={'team_id': team_id, 'game_date': game_date, 'limit': limit})
+    # NBA scores fit in int16; narrower columns mean less to move in the per-team aggregations
+    return history.astype(_SCORE_DTYPES)
 
 def get_head_to_head_history_simple(engine, home_team_id, away_team_id, game_date, limit=5):
     """Get limited head-to-head history between two teams"""
@@ -207,58 +222,23 @@ def get_head_to_head_history_simple(engine, home_team_id, away_team_id, game_dat
     LIMIT %(limit)s
     """
     
-    return pd.read_sql(query, engine, params={'home_team_id': home_team_id, 'away_team_id': away_team_id, 'game_date': game_date, 'limit': limit})
-
-def calculate_win_rate_simple(games_df, team_id):
-    """Calculate win rate for a team"""
-    if len(games_df) == 0:
-        return 0.5
-    
-    wins = 0
-    for _, game in games_df.iterrows():
-        if game['homeTeamId'] == team_id:
-            wins += 1 if game['homeScore'] > game['awayScore'] else 0
-        else:
-            wins += 1 if game['awayScore'] > game['homeScore'] else 0
-    
-    return wins / len(games_df)
+    history = pd.read_sql(query, engine, params={'home_team_id': home_team_id, 'away_team_id': away_team_id, 'game_date': game_date, 'limit': limit})
+    return history.astype(_SCORE_DTYPES)
 
-def calculate_points_for_simple(games_df, team_id):
-    """Calculate average points scored by a team"""
+def summarize_team_history_simple(games_df, team_id, recent_games=5):
+    """Calculate win rate, points for, points against and recent form for a team in one pass"""
     if len(games_df) == 0:
-        return 0
+        return 0.5, 0, 0, 0.5
     
-    total_points = 0
-    for _, game in games_df.iterrows():
-        if game['homeTeamId'] == team_id:
-            total_points += game['homeScore']
-        else:
-            total_points += game['awayScore']
+    # Resolve home/away once; every stat below reuses the same per-game team/opponent scores
+    is_home = games_df['homeTeamId'].to_numpy() == team_id
+    home_scores = games_df['homeScore'].to_numpy()
+    away_scores = games_df['awayScore'].to_numpy()
+    points_for = np.where(is_home, home_scores, away_scores)
+    points_against = np.where(is_home, away_scores, home_scores)
+    wins = points_for > points_against
     
-    return total_points / len(games_df)
-
-def calculate_points_against_simple(games_df, team_id):
-    """Calculate average points allowed by a team"""
-    if len(games_df) == 0:
-        return 0
-    
-    total_points = 0
-    for _, game in games_df.iterrows():
-        if game['homeTeamId'] == team_id:
-            total_points += game['awayScore']
-        else:
-            total_points += game['homeScore']
-    
-    return total_points / len(games_df)
-
-def calculate_point_differential_simple(games_df, team_id):
-    """Calculate point differential for a team"""
-    return calculate_points_for_simple(games_df, team_id) - calculate_points_against_simple(games_df, team_id)
-
-def calculate_recent_form_simple(games_df, team_id, num_games):
-    """Calculate recent form (win rate in last N games)"""
-    recent_games = games_df.head(num_games)
-    return calculate_win_rate_simple(recent_games, team_id)
+    return float(wins.mean()), float(points_for.mean()), float(points_against.mean()), float(wins[:recent_games].mean())
 
 def calculate_rest_days_simple(games_df, team_id, game_date):
     """Calculate rest days since last game"""
@@ -281,17 +261,18 @@ def calculate_h2h_away_wins_simple(h2h_df, away_team_id):
 
 def calculate_season_progress_simple(game_date, season):
     """Calculate season progress (0-1)"""
-    try:
-        year = int(season.split('-')[0])
-        season_start = datetime(year, 10, 1)
-        season_end = datetime(year + 1, 6, 30)
-        
-        total_days = (season_end - season_start).days
-        days_elapsed = (game_date - season_start).days
-        
-        return max(0, min(1, days_elapsed / total_days))
-    except:
+    start_year = season[:4] if isinstance(season, str) else ''
+    if game_date is None or not start_year.isdigit():
         return 0.5
+    
+    year = int(start_year)
+    season_start = datetime(year, 10, 1)
+    season_end = datetime(year + 1, 6, 30)
+    
+    total_days = (season_end - season_start).days
+    days_elapsed = (game_date - season_start).days
+    
+    return max(0, min(1, days_elapsed / total_days))
 
 def display_feature_summary(features_df):
     """Display summary of created features"""
@@ -38,7 +38,8 @@ def create_ml_model():
         y_clean = y_spread[non_push_mask]
         
         print(f"After removing push games: {len(X_clean)} games")
-        print(f"Target distribution: {y_clean.value_counts().to_dict()}")
+        target_counts = np.bincount(y_clean.to_numpy(dtype=np.int64), minlength=2)
+        print(f"Target distribution: {dict(enumerate(target_counts.tolist()))}")
         
         # 3. Split data
         X_train, X_test, y_train, y_test = train_test_split(
@@ -2,10 +2,22 @@ import pandas as pd
 import numpy as np
 import joblib
 import json
+import os
+from functools import lru_cache
+from sklearn.base import clone
 from sklearn.metrics import accuracy_score
 import warnings
 warnings.filterwarnings('ignore')
 
+@lru_cache(maxsize=4)
+def _load_artifact(path, mtime):
+    """Load a joblib artifact, cached per (path, mtime) across repeated backtests"""
+    return joblib.load(path)
+
+def load_artifact(path):
+    """Load a joblib artifact, reusing the cached copy until the file changes"""
+    return _load_artifact(path, os.path.getmtime(path))
+
 def simple_backtest(model_type='advanced'):
     """Simple backtest using existing ML features data"""
     print(f"Simple NBA Betting Model Backtest - {model_type.upper()} Model")
@@ -31,8 +43,9 @@ def simple_backtest(model_type='advanced'):
         
         # Load model and metadata
         print(f"Loading {model_type} model and data...")
-        model = joblib.load(files['model_file'])
-        scaler = joblib.load(files['scaler_file'])
+        # Both are refit below, so work on unfitted copies and leave the cached artifacts untouched
+        model = clone(load_artifact(files['model_file']))
+        scaler = clone(load_artifact(files['scaler_file']))
         
         with open(files['metadata_file'], 'r') as f:
             metadata = json.load(f)
@@ -46,22 +59,23 @@ def simple_backtest(model_type='advanced'):
         
         # 3. Prepare features
         feature_cols = metadata['feature_columns']
-        X = df[feature_cols].fillna(0)
+        # float32 ndarray up front: half the bytes, and sklearn skips its own DataFrame conversion
+        X = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32, na_value=0.0))
         y = df['id_spread'].fillna(0)
         
-        # Remove push games
-        non_push_mask = y != 2
-        X_clean = X[non_push_mask]
-        y_clean = y[non_push_mask]
-        df_clean = df[non_push_mask].reset_index(drop=True)
+        # Remove push games (one integer index shared by all three gathers)
+        keep = np.flatnonzero(y.to_numpy() != 2)
+        X_clean = X.take(keep, axis=0)
+        y_clean = y.take(keep)
+        df_clean = df.take(keep).reset_index(drop=True)
         
         print(f"After removing push games: {len(X_clean)} games")
         
         # 4. Time-based split (use first 70% for training, last 30% for testing)
         split_idx = int(len(X_clean) * 0.7)
         
-        X_train = X_clean.iloc[:split_idx]
-        X_test = X_clean.iloc[split_idx:]
+        X_train = X_clean[:split_idx]
+        X_test = X_clean[split_idx:]
         y_train = y_clean.iloc[:split_idx]
         y_test = y_clean.iloc[split_idx:]
         df_test = df_clean.iloc[split_idx:].reset_index(drop=True)
@@ -76,8 +90,9 @@ def simple_backtest(model_type='advanced'):
         model.fit(X_train_scaled, y_train)
         
         # 6. Make predictions
-        y_pred = model.predict(X_test_scaled)
+        # predict() is just the argmax of predict_proba, so run inference once
         y_pred_proba = model.predict_proba(X_test_scaled)
+        y_pred = model.classes_[np.argmax(y_pred_proba, axis=1)]
         
         # 7. Calculate performance metrics
         accuracy = accuracy_score(y_test, y_pred)
@@ -163,16 +178,21 @@ def simple_backtest(model_type='advanced'):
             # 12. Confidence threshold analysis
             print(f"\nCONFIDENCE THRESHOLD ANALYSIS")
             print("-" * 50)
-            thresholds = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8]
+            thresholds = np.array([0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8])
+            
+            # Sort confidences once; the bets at each threshold are then a suffix
+            # found by binary search, with correct counts from a suffix sum
+            order = np.argsort(max_probs, kind='stable')
+            sorted_probs = max_probs[order]
+            sorted_correct = (y_test.to_numpy() == y_pred)[order]
+            correct_from = np.append(np.cumsum(sorted_correct[::-1])[::-1], 0)
+            starts = np.searchsorted(sorted_probs, thresholds, side='left')
             
-            for threshold in thresholds:
-                mask = max_probs >= threshold
-                if np.any(mask):
-                    filtered_y_test = y_test[mask]
-                    filtered_y_pred = y_pred[mask]
-                    filtered_bets = len(filtered_y_test)
-                    filtered_correct = sum(filtered_y_test == filtered_y_pred)
-                    filtered_win_rate = filtered_correct / filtered_bets if filtered_bets > 0 else 0
+            for threshold, start in zip(thresholds, starts):
+                filtered_bets = int(len(sorted_probs) - start)
+                if filtered_bets > 0:
+                    filtered_correct = int(correct_from[start])
+                    filtered_win_rate = filtered_correct / filtered_bets
                     
                     # Calculate ROI for this threshold
                     filtered_roi = ((filtered_correct * (bet_amount + win_amount) - 